@@ -0,0 +1 @@
+# Lets the tests import hospital_sim from the repository root.
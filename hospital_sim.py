@@ -1,6 +1,58 @@
-from random import random
 import numpy as np
 import math
+import argparse
+import copy
+import os
+import threading
+import time
+import traceback
+from itertools import count
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+from statistics import NormalDist
+
+class RandomStream():
+    """
+      Source of random numbers for one random process in the simulation. Every variate is 
+      produced from a single uniform by inversion, so an antithetic stream with the same seed 
+      as another stream draws 1 - U wherever the other stream drew U.
+    """
+    def __init__(self, seed=None, antithetic=False):
+        self.generator = np.random.default_rng(seed)
+        self.antithetic = antithetic
+
+    def random(self):
+        u = self.generator.random()
+        return 1 - u if self.antithetic else u
+
+    def uniform(self, low, high):
+        return low + (high - low) * self.random()
+
+    def triangular(self, left, mode, right):
+        u = self.random()
+        if u <= (mode - left) / (right - left):
+            return left + math.sqrt(u * (right - left) * (mode - left))
+        return right - math.sqrt((1 - u) * (right - left) * (right - mode))
+
+# Each random process draws from its own stream so that replications stay aligned per process.
+# Every generator draws a fixed number of uniforms per call, so the n-th call of a process uses
+# the same uniforms in both runs of an antithetic pair. Arrivals, triage (first come, first 
+# served) and ambulance dispatches are called in the same order in both runs; workup and 
+# procedure draws follow the service order, which drifts apart once the queues differ.
+RANDOM_PROCESSES = ("walk_in_arrivals", "ambulance_arrivals", "triage", "workup", "procedures", "ambulance")
+random_streams = {process: RandomStream() for process in RANDOM_PROCESSES}
+
+def initialize_random_streams(seed=None, antithetic=False):
+   """
+   Creates one independent stream per random process from the given seed. Two replications 
+   initialized with the same seed, one of them antithetic, form an antithetic pair.
+   """
+   global random_streams
+   seeds = np.random.SeedSequence(seed).spawn(len(RANDOM_PROCESSES))
+   random_streams = {
+      process: RandomStream(seed=process_seed, antithetic=antithetic)
+      for process, process_seed in zip(RANDOM_PROCESSES, seeds)
+   }
 
 class Patient():
     """
@@ -22,8 +74,10 @@ class Patient():
 
     def assign_triage_type(self, triage_type):
         self.triage_type = triage_type
+        # Ambulance patients are assessed by the ambulance crew, walk-ins at triage. A uniform is
+        # drawn for every patient to keep the streams aligned.
+        r = random_streams["ambulance" if self.arrival_type == 0 else "triage"].random()
         if triage_type in {1,2,4}:
-            r = random()
             if r <= 0.5:
                 self.complaint = 1 # 1 - Trauma, 2 - Stoke, 4 - Laceration
             else:
@@ -97,22 +151,27 @@ class EndSimulationEvent(Event):
     def __init__(self, time=None):
         super().__init__(type="End Simulation", time=time)
 
-def generate_interarrival_time(clock, arrival_type):
+def arrival_rate(clock, arrival_type):
       """
-      Generates interarrival time using lambda value of number of patients / hour. 
+      Returns the lambda value (number of patients / hour) for the time of day at clock.
       """
-      r = random()
-      a = 0
       hours = clock % (24 * 60) / 60
 
       if ((hours >= 0 and hours <= 7) or hours == 23):
-          a = 6 if arrival_type == 1 else 14
+          return 6 if arrival_type == 1 else 14
       elif (hours >= 7 and hours <= 11):
-          a = 9 if arrival_type == 1 else 10
+          return 9 if arrival_type == 1 else 10
       elif (hours >= 12 and hours <= 17):
-          a = 15 if arrival_type == 1 else 10
+          return 15 if arrival_type == 1 else 10
       else:
-          a = 18 if arrival_type == 1 else 12
+          return 18 if arrival_type == 1 else 12
+
+def generate_interarrival_time(clock, arrival_type):
+      """
+      Generates interarrival time using lambda value of number of patients / hour. 
+      """
+      r = random_streams["ambulance_arrivals" if arrival_type == 0 else "walk_in_arrivals"].random()
+      a = arrival_rate(clock, arrival_type)
       
       return (math.log(1 - r)/(a/60)) * -1
 
@@ -121,30 +180,31 @@ def generate_triage_time(patient):
    Generates service time for triage assessment (only for walk-in patients)
    """
    if (patient.triage_type == 3):
-      return np.random.uniform(0.75, 2.25) # More urgent triaging for type 3
-   return np.random.uniform(7.5, 11.25)
+      return random_streams["triage"].uniform(0.75, 2.25) # More urgent triaging for type 3
+   return random_streams["triage"].uniform(7.5, 11.25)
    
 def generate_workup_service_time(patient):
    """
    Generates workup service time for patients of different triage types and 
-   associated chief complaints.
+   associated chief complaints. One uniform is drawn per call, also for constant times.
    """
+   r = random_streams["workup"].random()
    if (patient.triage_type == 1):
        if (patient.complaint == 1):
-           return np.random.uniform(5, 12)
+           return 5 + 7 * r
        else:
-           return np.random.uniform(2, 5)
+           return 2 + 3 * r
    elif (patient.triage_type == 2):
        if (patient.complaint == 1):
-             return np.random.uniform(5, 15)
+             return 5 + 10 * r
        else:
            return 2
    elif (patient.triage_type == 3):
-       return np.random.uniform(5, 10)
+       return 5 + 5 * r
    elif (patient.triage_type == 4):
        return 2
    else:
-       return np.random.uniform(5, 10)
+       return 5 + 5 * r
 
 def generate_procedure_time(patient):
    """
@@ -152,22 +212,22 @@ def generate_procedure_time(patient):
    and associated chief complaint.
    """
    procedure_times = {
-       1 : np.random.uniform(3, 5), # X-ray
-       2: np.random.triangular(10, 25, 50, 1)[0], # Surgery Type A
-       3: np.random.triangular(30, 45, 90, 1)[0], # Surgery Type B
-       4: np.random.uniform(7, 10), # ECG
-       5: np.random.uniform(10, 25), # CT Scan
-       6: np.random.uniform(2, 5), # Medication
-       7: np.random.uniform(5, 10), # Oxygen Therapy
-       8: np.random.uniform(2, 3), # Nebulizer
-       9: np.random.uniform(5, 15), # Cast/Splint
-       10: np.random.triangular(10, 15, 25, 1)[0], # Stitches
-       11: np.random.uniform(2, 5), # Tetanus Shot
+       1 : random_streams["procedures"].uniform(3, 5), # X-ray
+       2: random_streams["procedures"].triangular(10, 25, 50), # Surgery Type A
+       3: random_streams["procedures"].triangular(30, 45, 90), # Surgery Type B
+       4: random_streams["procedures"].uniform(7, 10), # ECG
+       5: random_streams["procedures"].uniform(10, 25), # CT Scan
+       6: random_streams["procedures"].uniform(2, 5), # Medication
+       7: random_streams["procedures"].uniform(5, 10), # Oxygen Therapy
+       8: random_streams["procedures"].uniform(2, 3), # Nebulizer
+       9: random_streams["procedures"].uniform(5, 15), # Cast/Splint
+       10: random_streams["procedures"].triangular(10, 15, 25), # Stitches
+       11: random_streams["procedures"].uniform(2, 5), # Tetanus Shot
    }
 
    total_time = 0
-   r1 = random()
-   r2 = random()
+   r1 = random_streams["procedures"].random()
+   r2 = random_streams["procedures"].random()
 
    if (patient.triage_type == 1):
        if (patient.complaint == 1):
@@ -217,7 +277,7 @@ def generate_ambulance_arrival_triage_type():
    Assigns triage type for ambulance patients (limited to types 1,2,3,4)
    """
    triage_type = None
-   r = random()
+   r = random_streams["ambulance"].random()
    if r <= 0.2:
       triage_type = 1
    elif r <= 0.55:
@@ -232,7 +292,7 @@ def generate_walk_in_triage_type():
    """
    Assigns triage type for walk-in patients (limited to types 3,4,5)
    """
-   r = random()
+   r = random_streams["triage"].random()
    triage_type = 0
    if r <= 0.33333:
          triage_type = 3
@@ -242,7 +302,159 @@ def generate_walk_in_triage_type():
          triage_type = 5  
    return triage_type
 
-def emergency_department_simulation(simulation_time):
+# Record layout of a historical arrival trace. Times are minutes since midnight of the first
+# day in the trace, arrival types follow the simulation (0 - ambulance, 1 - walk-in) and a triage
+# type or complaint of 0 means the value was not recorded and gets generated as usual.
+ARRIVAL_TRACE_DTYPE = np.dtype([
+    ("time", "<f8"),
+    ("arrival_type", "u1"),
+    ("triage_type", "u1"),
+    ("complaint", "u1"),
+])
+
+def save_arrival_trace(path, times, arrival_types, triage_types, complaints):
+   """
+   Writes historical arrival records to a .npy file in the layout read by load_arrival_trace.
+   Records are sorted by arrival time before being written.
+   """
+   trace = np.empty(len(times), dtype=ARRIVAL_TRACE_DTYPE)
+   trace["time"] = times
+   trace["arrival_type"] = arrival_types
+   trace["triage_type"] = triage_types
+   trace["complaint"] = complaints
+   np.save(path, trace[np.argsort(trace["time"], kind="stable")])
+
+def check_arrival_trace(trace, name="Arrival trace"):
+   """
+   Raises ValueError if trace is not an array with ARRIVAL_TRACE_DTYPE.
+   """
+   dtype = getattr(trace, "dtype", None)
+   if dtype != ARRIVAL_TRACE_DTYPE:
+      raise ValueError(f"{name} has dtype {dtype}, expected {ARRIVAL_TRACE_DTYPE}")
+
+def load_arrival_trace(path):
+   """
+   Opens a historical arrival trace as a memory-mapped array so that records are only
+   read from disk as the replay reaches them.
+   """
+   trace = np.load(path, mmap_mode="r")
+   check_arrival_trace(trace, f"Arrival trace {path}")
+   return trace
+
+def stream_arrival_trace(trace, chunk_size=65536):
+   """
+   Yields (time, arrival_type, triage_type, complaint) records from an arrival trace. Only one
+   chunk of the trace is converted to Python objects at a time, and each chunk is checked to 
+   continue in time order from the previous one before it is replayed (ValueError otherwise).
+   """
+   previous_time = -math.inf
+   for start in range(0, len(trace), chunk_size):
+      chunk = trace[start:start + chunk_size]
+      times = np.concatenate(([previous_time], chunk["time"]))
+      decreasing = np.flatnonzero(np.diff(times) < 0)
+      if len(decreasing) > 0:
+         index = start + decreasing[0]
+         raise ValueError(f"Arrival trace is not sorted by time: record {index} at {times[decreasing[0] + 1]} "
+                          f"follows an arrival at {times[decreasing[0]]}")
+      previous_time = times[-1]
+      for record in chunk.tolist():
+         yield record
+
+# Default number of servers available for each process
+DEFAULT_MAX_NUM_SERVERS = {
+    "doctors":2,
+    "nurses":2,
+    "specialists":5,
+}
+
+# Default number of beds available per zone
+DEFAULT_BEDS_PER_ZONE = {
+   1 : 12,
+   2 : 8, 
+   3 : 10, 
+   4 : 10, 
+}
+
+# Global variables making up the state of a running simulation
+SIMULATION_STATE_VARIABLES = (
+   "clock", "fel", "max_num_servers", "status_triage_nurses", "status_workup_doctors", 
+   "status_specialists", "total_patients", "max_queue_lengths", "number_triage_queue", 
+   "number_waiting_for_bed_queue", "number_workup_queue", "number_specialist_queue", 
+   "number_of_beds_per_zone", "interrupt_lists", "bed_queue_lists", "workup_queue_lists", 
+   "triage_queue_list", "specialist_queue_list", "time_weighted_queue", "server_uptime", 
+   "total_interrupts", "available_ambulances", "diverted_ambulances", "time_in_diversion",
+)
+
+def capture_simulation_state():
+   """
+   Returns a snapshot of the current simulation state (clock, FEL, queues, servers and 
+   statistics) that can be passed back to emergency_department_simulation as initial_state.
+   """
+   return copy.deepcopy({name: globals()[name] for name in SIMULATION_STATE_VARIABLES})
+
+def restore_simulation_state(state):
+   """
+   Sets the simulation state to a copy of a snapshot taken by capture_simulation_state, 
+   leaving the snapshot itself untouched so it can be restored again.
+   """
+   globals().update(copy.deepcopy(state))
+
+def bed_queue_length():
+   """
+   Returns the number of patients currently waiting for a bed. number_waiting_for_bed_queue is not
+   decreased when a queued patient gets a bed, so it counts every patient that ever waited.
+   """
+   return sum(len(queue) for queue in bed_queue_lists.values())
+
+def occupied_beds_per_zone():
+   """
+   Returns the number of occupied beds per zone, counted from the patients in a bed: those in
+   workup or with a specialist (on the FEL), waiting for either, or interrupted. The free beds in 
+   number_of_beds_per_zone are not decreased when a queued patient gets a bed.
+   """
+   occupied = dict.fromkeys(number_of_beds_per_zone, 0)
+   patients = [event.patient for event in fel if isinstance(event, (DepartureWorkupEvent, DepartureSpecialistEvent))]
+   patients += specialist_queue_list
+   for queues in (workup_queue_lists, interrupt_lists):
+      for queue in queues.values():
+         patients += queue
+   for patient in patients:
+      if patient.zone is not None:
+         occupied[patient.zone] += 1
+   return occupied
+
+def simulation_counters():
+   """
+   Returns the state counters of the running simulation in the order of TRACE_COUNTERS.
+   """
+   return (number_triage_queue, bed_queue_length(), number_workup_queue, number_specialist_queue,
+           status_triage_nurses, status_workup_doctors, status_specialists, available_ambulances, 
+           diverted_ambulances, number_of_beds_per_zone[1], number_of_beds_per_zone[2], 
+           number_of_beds_per_zone[3], number_of_beds_per_zone[4], total_patients["in"], total_patients["out"])
+
+def emergency_department_simulation(simulation_time, arrival_trace=None, seed=None, antithetic=False,
+                                    initial_state=None, stop_condition=None, servers=None, beds_per_zone=None,
+                                    warm_up_time=20160, event_observer=None):
+   """
+   Runs one replication of the ED simulation. Arrivals are generated synthetically unless an
+   arrival_trace (a path to a .npy trace or an array with ARRIVAL_TRACE_DTYPE) is given, in which
+   case walk-in and ambulance arrivals are replayed from the trace. Replayed patients reach the
+   ED at their recorded times, so the ambulance fleet is not simulated.
+
+   The random streams are initialized from seed; with antithetic=True every uniform is replaced 
+   by 1 - U, mirroring the replication run with the same seed.
+
+   A run can continue from a snapshot taken by capture_simulation_state by passing it as 
+   initial_state. If stop_condition is given it is checked after every event, and once it 
+   returns True the run stops early and returns None, leaving the simulation state in place.
+
+   servers and beds_per_zone override DEFAULT_MAX_NUM_SERVERS and DEFAULT_BEDS_PER_ZONE.
+   Statistics are only recorded for events after warm_up_time (14 days by default). Average
+   queue times per customer are NaN if no patient left the ED.
+
+   If event_observer is given it is called after every event with the event and the state
+   counters returned by simulation_counters (see record_event_trace).
+   """
    global clock
    global fel
    global max_num_servers
@@ -268,32 +480,38 @@ def emergency_department_simulation(simulation_time):
    global diverted_ambulances
    global time_in_diversion
 
+   initialize_random_streams(seed, antithetic)
+
    clock = 0
    
    available_ambulances = 10
    diverted_ambulances = 0
 
-   # FEL starts off with an arrival of both ambulance and walk-in at t = 0
-   initial_ambulance_patient = Patient(arrival_type=0)
-   initial_walkin_patient = Patient(arrival_type=1)
-   available_ambulances -= 1
-   fel = [DepartureAmbulanceEvent(time=0, patient=initial_ambulance_patient), 
-          WalkInArrivalEvent(time=0, patient=initial_walkin_patient)]
+   if arrival_trace is None:
+      trace_records = None
+
+      # FEL starts off with an arrival of both ambulance and walk-in at t = 0
+      initial_ambulance_patient = Patient(arrival_type=0)
+      initial_walkin_patient = Patient(arrival_type=1)
+      available_ambulances -= 1
+      fel = [DepartureAmbulanceEvent(time=0, patient=initial_ambulance_patient), 
+             WalkInArrivalEvent(time=0, patient=initial_walkin_patient)]
+   else:
+      if isinstance(arrival_trace, (str, os.PathLike)):
+         arrival_trace = load_arrival_trace(arrival_trace)
+      else:
+         check_arrival_trace(arrival_trace)
+      trace_records = stream_arrival_trace(arrival_trace)
+
+      # FEL starts off with the first recorded arrival; the run ends at simulation_time even if
+      # the trace runs out before then
+      fel = [EndSimulationEvent(time=simulation_time)]
 
    # Set number of servers available for each process
-   max_num_servers = {
-       "doctors":2,
-       "nurses":2,
-       "specialists":5,
-   }
+   max_num_servers = dict(DEFAULT_MAX_NUM_SERVERS if servers is None else servers)
 
    # Set number of beds available per zone
-   number_of_beds_per_zone = {
-      1 : 12,
-      2 : 8, 
-      3 : 10, 
-      4 : 10, 
-   }
+   number_of_beds_per_zone = dict(DEFAULT_BEDS_PER_ZONE if beds_per_zone is None else beds_per_zone)
 
    # State Variables - Resource Statuses
    status_workup_doctors = 0
@@ -358,6 +576,45 @@ def emergency_department_simulation(simulation_time):
 
    time_in_diversion = []
    ##################################################
+
+   if initial_state is not None:
+      # Continue from a snapshot instead of an empty ED
+      restore_simulation_state(initial_state)
+
+   def schedule_next_arrival(arrival_type):
+      """
+      Helper method used to add the next arrival to the FEL. Synthetic arrivals are generated 
+      separately for each arrival type, while trace-driven arrivals are read in time order 
+      regardless of type, so each replayed arrival schedules the one after it.
+      """
+      if trace_records is None:
+         a = generate_interarrival_time(clock, arrival_type)
+         if arrival_type == 0:
+            fel.append(DepartureAmbulanceEvent(time=clock + a, patient=Patient(arrival_type=0)))
+         else:
+            fel.append(WalkInArrivalEvent(time=clock + a, patient=Patient(arrival_type=1)))
+         return
+
+      record = next(trace_records, None)
+      if record is None:
+         return
+      time, arrival_type, triage_type, complaint = record
+      patient = Patient(arrival_type=arrival_type)
+      if triage_type != 0:
+         if complaint != 0:
+            patient.triage_type = triage_type
+            patient.complaint = complaint
+         else:
+            patient.assign_triage_type(triage_type)
+      elif arrival_type == 0: # Ambulance patients are not triaged at the ED
+         patient.assign_triage_type(generate_ambulance_arrival_triage_type())
+      if arrival_type == 0:
+         # Ambulance records are replayed as the patient arriving at the ED
+         fel.append(AmbulanceHospitalArrivalEvent(time=time, patient=patient))
+      else:
+         fel.append(WalkInArrivalEvent(time=time, patient=patient))
+      return
+
    def check_bed_queue(zone, patient):
       """
       Helper method used to remove patients waiting for a bed from the queue when another
@@ -501,12 +758,12 @@ def emergency_department_simulation(simulation_time):
          return True if event_to_interrupt else False
       ###################################################################################################
 
-      # Generate next arrival event
       arrival_type = event.patient.arrival_type
-      
-      a = generate_interarrival_time(clock, arrival_type)
 
-      if arrival_type == 0: # Ambulance arrival
+      if arrival_type == 0 and trace_records is not None:
+         # Replayed ambulance patients arrive at their recorded time without a simulated dispatch
+         schedule_next_arrival(arrival_type)
+      elif arrival_type == 0: # Ambulance arrival
          available_ambulances += 1
          if (event.diverted_ambulance): # If diverted, ambulance arrives with no patient
             diverted_ambulances -= 1
@@ -514,11 +771,11 @@ def emergency_department_simulation(simulation_time):
             return
       else:
           # Generate next walk-in arrival event
-          fel.append(WalkInArrivalEvent(time=clock + a, patient=Patient(arrival_type=arrival_type)))
+          schedule_next_arrival(arrival_type)
 
       patient = event.patient
       if (arrival_type == 0):
-         if patient.triage_type == 3 or patient.triage_type == 4:
+         if patient.triage_type in {3,4,5}: # Type 5 only arrives by ambulance in replayed traces
             if number_of_beds_per_zone[3] > 0:
                assign_type_3_4_5_patient_to_zone(patient, 3)
             elif number_of_beds_per_zone[4] > 0:
@@ -553,7 +810,8 @@ def emergency_department_simulation(simulation_time):
               triage_queue_list.append(patient)
           else:
               status_triage_nurses += 1
-              patient.assign_triage_type(triage_type=generate_walk_in_triage_type())
+              if patient.triage_type is None: # Replayed patients arrive with a recorded triage type
+                 patient.assign_triage_type(triage_type=generate_walk_in_triage_type())
               triage_time = generate_triage_time(patient) 
               fel.append(DepartureTriageEvent(patient=patient, time=clock+triage_time))
 
@@ -572,21 +830,22 @@ def emergency_department_simulation(simulation_time):
        global available_ambulances
        global diverted_ambulances
 
-       a = generate_interarrival_time(clock, 0)
-       fel.append(DepartureAmbulanceEvent(time=clock + a, patient=Patient(arrival_type=0)))
+       schedule_next_arrival(0)
 
-       travel_time = np.random.triangular(5, 10, 20, 1)[0]
-       process_time = np.random.uniform(4, 10)
-       triage_type = generate_ambulance_arrival_triage_type()
+       # Diverted travel time is drawn for every call to keep the ambulance stream aligned
+       travel_time = random_streams["ambulance"].triangular(5, 10, 20)
+       process_time = random_streams["ambulance"].uniform(4, 10)
+       diverted_travel_time = random_streams["ambulance"].triangular(10, 15, 25)
 
-       event.patient.assign_triage_type(triage_type=triage_type)
+       if event.patient.triage_type is None: # Replayed patients arrive with a recorded triage type
+          event.patient.assign_triage_type(triage_type=generate_ambulance_arrival_triage_type())
+       triage_type = event.patient.triage_type
        if (available_ambulances > 0):
             available_ambulances -= 1
-            if ((triage_type in {1,2}) or (number_waiting_for_bed_queue < 5 and triage_type in {3,4})):
+            if ((triage_type in {1,2}) or (number_waiting_for_bed_queue < 5 and triage_type in {3,4,5})):
                fel.append(AmbulanceHospitalArrivalEvent(time=clock + travel_time*2 + process_time, patient=event.patient))
             else:
                diverted_ambulances += 1
-               diverted_travel_time = np.random.triangular(10, 15, 25, 1)[0]
                fel.append(AmbulanceHospitalArrivalEvent(time=clock+travel_time+process_time+diverted_travel_time, patient=event.patient, diverted_ambulance=True))
        update_simulation_statistics(event)
        return
@@ -614,7 +873,8 @@ def emergency_department_simulation(simulation_time):
           patient = triage_queue_list.pop(0)
           number_triage_queue -= 1
           status_triage_nurses += 1
-          patient.assign_triage_type(triage_type=generate_walk_in_triage_type())
+          if patient.triage_type is None:
+             patient.assign_triage_type(triage_type=generate_walk_in_triage_type())
           triage_time = generate_triage_time(patient)  
           fel.append(DepartureTriageEvent(patient=patient, time=clock+triage_time))
 
@@ -723,7 +983,7 @@ def emergency_department_simulation(simulation_time):
        Method used to update counters and calculate statistics called after each event.
        """
        delta_t = event.time - prev_event_time
-       if (event.time > 20160):
+       if (event.time > warm_up_time):
          # Average queue length
          time_weighted_queue["Triage"].append(delta_t * number_triage_queue)
          time_weighted_queue["Bed"].append(delta_t * number_waiting_for_bed_queue)
@@ -746,6 +1006,10 @@ def emergency_department_simulation(simulation_time):
 
        return
 
+   if trace_records is not None:
+      schedule_next_arrival(None)
+      fel.sort(key=lambda x: x.time, reverse = False)
+
    while clock <= simulation_time:
       event = fel.pop(0)
       prev_event_time = clock
@@ -759,10 +1023,20 @@ def emergency_department_simulation(simulation_time):
          handle_triage_departure(event)
       elif event.type == 5: # Departure from Initial Workup Assessment
          handle_workup_departure(event)
+      elif event.type == "End Simulation": # End of a trace-driven run
+         update_simulation_statistics(event)
       else: # Departure from Specialist Assessment (i.e. Departure from ED)
          handle_specialist_departure(event)
+
+      if event_observer is not None:
+         event_observer(event, simulation_counters())
+      if event.type == "End Simulation":
+         break
       
       fel.sort(key=lambda x: x.time, reverse = False)
+
+      if stop_condition is not None and stop_condition():
+         return None
    
    # print("\nNumber of doctors: ", max_num_servers["doctors"])
    # print("Number of triage nurses: ", max_num_servers["nurses"])
@@ -776,11 +1050,13 @@ def emergency_department_simulation(simulation_time):
       "Specialist": sum(time_weighted_queue["Specialist"])/clock
    }
 
+   # NaN if no patient left the ED, e.g. when replaying an empty trace
+   patients_out = total_patients["out"] if total_patients["out"] > 0 else math.nan
    average_queue_time_per_customer = {
-       "Triage": sum(time_weighted_queue['Triage'])/total_patients["out"],
-       "Bed": sum(time_weighted_queue['Bed'])/total_patients["out"],
-       "Workup": sum(time_weighted_queue["Workup"])/total_patients["out"],
-       "Specialist": sum(time_weighted_queue["Specialist"])/total_patients["out"]    
+       "Triage": sum(time_weighted_queue['Triage'])/patients_out,
+       "Bed": sum(time_weighted_queue['Bed'])/patients_out,
+       "Workup": sum(time_weighted_queue["Workup"])/patients_out,
+       "Specialist": sum(time_weighted_queue["Specialist"])/patients_out    
    }
 
    total_server_uptime = {
@@ -811,14 +1087,990 @@ def emergency_department_simulation(simulation_time):
            'Server Idle Rate': server_idle_rate,
            'Percentage of Time Ambulances Spent in Diversion': {'Ambulance Diversion':time_percentage_of_ambulances_in_diversion}}
 
-def main():
-   number_of_replications = 10
+def bed_queue_importance():
+   """
+   Importance function for multilevel splitting: the number of patients waiting for a bed.
+   """
+   return bed_queue_length()
+
+def ambulance_diversion_event():
+   """
+   Rare event for multilevel splitting: more than half of the ambulance fleet is diverted.
+   """
+   return diverted_ambulances > 10 / 2
+
+def multilevel_splitting(thresholds, simulation_time, rare_event=None, importance_function=bed_queue_importance,
+                         effort=100, repetitions=10, confidence=0.95, seed=None):
+   """
+   Estimates the probability of a rare event occurring before simulation_time using fixed-effort
+   multilevel splitting. Each level runs effort trajectories, each starting from a randomly chosen
+   state saved when a trajectory of the previous level first reached its threshold of the 
+   importance function, and the estimate is the product of the fractions reaching each level.
+
+   The rare event is the importance function reaching the last threshold, unless rare_event is 
+   given, in which case it is rare_event returning True (e.g. bed_queue_importance with 
+   thresholds [5, 10, 15] and ambulance_diversion_event). The estimator is unbiased, and the
+   confidence interval comes from repeating it independently repetitions times.
+   """
+   rng = np.random.default_rng(seed)
+   estimates = []
+   simulated_trajectories = 0
+   # Levels a repetition never reached because an earlier level had no hits stay NaN
+   level_probabilities = np.full((repetitions, len(thresholds)), np.nan)
+
+   for repetition in range(repetitions):
+      entrance_states = [None] # The first level starts from an empty ED
+      estimate = 1
+
+      for level, threshold in enumerate(thresholds):
+         def reached():
+            if level == len(thresholds) - 1 and rare_event is not None:
+               return rare_event()
+            # A rare event hit early counts as reaching every remaining level
+            return importance_function() >= threshold or (rare_event is not None and rare_event())
+
+         next_entrance_states = []
+         for trajectory in range(effort):
+            state = entrance_states[rng.integers(len(entrance_states))]
+            if state is not None:
+               restore_simulation_state(state)
+               if reached():
+                  next_entrance_states.append(state)
+                  continue
+            simulated_trajectories += 1
+            # Trajectories stop at the horizon instead of computing end-of-run statistics, and 
+            # record no per-event statistics, which would otherwise be copied with every snapshot
+            emergency_department_simulation(simulation_time, seed=int(rng.integers(2**63)), 
+                                            initial_state=state, warm_up_time=math.inf,
+                                            stop_condition=lambda: reached() or fel[0].time > simulation_time)
+            if reached():
+               next_entrance_states.append(capture_simulation_state())
+
+         level_probabilities[repetition, level] = len(next_entrance_states) / effort
+         estimate *= level_probabilities[repetition, level]
+         if estimate == 0:
+            break
+         entrance_states = next_entrance_states
+
+      estimates.append(estimate)
+
+   mean = float(np.mean(estimates))
+   half_width = 0
+   if repetitions > 1:
+      z = NormalDist().inv_cdf((1 + confidence) / 2)
+      half_width = z * float(np.std(estimates, ddof=1)) / math.sqrt(repetitions)
+
+   return {'Probability Estimate': mean,
+           'Confidence Interval': (max(mean - half_width, 0), mean + half_width),
+           'Level Probabilities': {threshold: float(np.mean(p[~np.isnan(p)])) if np.any(~np.isnan(p)) else math.nan
+                                  for threshold, p in zip(thresholds, level_probabilities.T)},
+           'Simulated Trajectories': simulated_trajectories}
+
+######################## Warm-start nowcasting ########################
+# Stages a patient can be in when taking a census of the ED
+CENSUS_STAGES = ("triage queue", "triage", "bed queue", "workup queue", "workup", "specialist queue", "specialist")
+
+def generate_ambulance_trip_time(diverted):
+   """
+   Generates the time from dispatch until an ambulance arrives back at the hospital, with the
+   same travel and processing times as handle_ambulance_departure_event.
+   """
+   travel_time = random_streams["ambulance"].triangular(5, 10, 20)
+   process_time = random_streams["ambulance"].uniform(4, 10)
+   if diverted:
+      return travel_time + process_time + random_streams["ambulance"].triangular(10, 15, 25)
+   return travel_time * 2 + process_time
+
+def sample_residual_time(generate, elapsed, attempts=100):
+   """
+   Samples the remaining time of a service that has already lasted elapsed minutes by drawing
+   service times until one exceeds elapsed. Returns 0 (the service ends now) if none does.
+   """
+   if elapsed <= 0:
+      return generate()
+   for attempt in range(attempts):
+      service_time = generate()
+      if service_time > elapsed:
+         return service_time - elapsed
+   return 0
+
+def census_initial_state(census, servers=None, beds_per_zone=None):
+   """
+   Builds a simulation state, to be passed to emergency_department_simulation as initial_state, 
+   from a census of the ED. The census is a dict with:
+      time - minutes since midnight (or since the start of any day) the census was taken at
+      patients - list of dicts with the stage (one of CENSUS_STAGES), elapsed minutes in that 
+                 stage, arrival_type, triage_type, complaint and zone (for patients in a bed)
+      ambulances - list of dicts for ambulances out, with elapsed minutes since dispatch, 
+                   whether they were diverted and the triage_type/complaint of their patient
+   Queues and busy servers follow from the stages of the patients. Remaining service and trip 
+   times are sampled conditional on the elapsed times, and unknown triage types or complaints 
+   are generated as for new patients.
+
+   Raises ValueError for a census the simulation could not have reached, such as patients 
+   waiting in a queue while a server (or, for the bed queue, a bed they can use) is free.
+   """
+   clock = census["time"]
+   max_num_servers = dict(DEFAULT_MAX_NUM_SERVERS if servers is None else servers)
+   number_of_beds_per_zone = dict(DEFAULT_BEDS_PER_ZONE if beds_per_zone is None else beds_per_zone)
+   queue_keys = {1: "1", 2: "2", 3: "3,4,5", 4: "3,4,5", 5: "3,4,5"}
+
+   fel = [DepartureAmbulanceEvent(time=clock + generate_interarrival_time(clock, 0), patient=Patient(arrival_type=0)),
+          WalkInArrivalEvent(time=clock + generate_interarrival_time(clock, 1), patient=Patient(arrival_type=1))]
+   triage_queue_list = []
+   bed_queue_lists = {"1": [], "2": [], "3,4,5": []}
+   workup_queue_lists = {"1": [], "2": [], "3,4,5": []}
+   specialist_queue_list = []
+   busy_servers = {"triage": 0, "workup": 0, "specialist": 0}
+
+   # Longest waiting patients are queued first
+   for record in sorted(census.get("patients", []), key=lambda record: -record.get("elapsed", 0)):
+      stage = record["stage"]
+      if stage not in CENSUS_STAGES:
+         raise ValueError(f"Unknown census stage {stage!r}, expected one of {CENSUS_STAGES}")
+      patient = Patient(arrival_type=record.get("arrival_type", 1), zone=record.get("zone"))
+      if record.get("triage_type") is not None:
+         patient.assign_triage_type(record["triage_type"])
+         if record.get("complaint") is not None:
+            patient.complaint = record["complaint"]
+      elif patient.arrival_type == 0:
+         patient.assign_triage_type(generate_ambulance_arrival_triage_type())
+      elif stage != "triage queue":
+         patient.assign_triage_type(generate_walk_in_triage_type())
+
+      if stage in {"workup queue", "workup", "specialist queue", "specialist"}:
+         if patient.zone not in number_of_beds_per_zone:
+            raise ValueError(f"Patient in stage {stage!r} needs a bed zone, got {patient.zone!r}")
+         number_of_beds_per_zone[patient.zone] -= 1
+         if number_of_beds_per_zone[patient.zone] < 0:
+            raise ValueError(f"Census has more patients than beds in zone {patient.zone}")
+
+      elapsed = record.get("elapsed", 0)
+      if stage == "triage queue":
+         triage_queue_list.append(patient)
+      elif stage == "triage":
+         residual = sample_residual_time(lambda: generate_triage_time(patient), elapsed)
+         fel.append(DepartureTriageEvent(patient=patient, time=clock + residual))
+      elif stage == "bed queue":
+         bed_queue_lists[queue_keys[patient.triage_type]].append(patient)
+      elif stage == "workup queue":
+         workup_queue_lists[queue_keys[patient.triage_type]].append(patient)
+      elif stage == "workup":
+         residual = sample_residual_time(lambda: generate_workup_service_time(patient), elapsed)
+         fel.append(DepartureWorkupEvent(patient=patient, time=clock + residual))
+      elif stage == "specialist queue":
+         specialist_queue_list.append(patient)
+      else:
+         residual = sample_residual_time(lambda: generate_procedure_time(patient), elapsed)
+         fel.append(DepartureSpecialistEvent(patient=patient, time=clock + residual))
+      if stage in busy_servers:
+         busy_servers[stage] += 1
+
+   for stage, servers_key in (("triage", "nurses"), ("workup", "doctors"), ("specialist", "specialists")):
+      if busy_servers[stage] > max_num_servers[servers_key]:
+         raise ValueError(f"Census has {busy_servers[stage]} patients in {stage}, but only "
+                          f"{max_num_servers[servers_key]} {servers_key}")
+
+   # Queued patients are only possible while every server they wait for is busy
+   queues = {
+      "triage": len(triage_queue_list),
+      "workup": sum(len(queue) for queue in workup_queue_lists.values()),
+      "specialist": len(specialist_queue_list),
+   }
+   for stage, servers_key in (("triage", "nurses"), ("workup", "doctors"), ("specialist", "specialists")):
+      if queues[stage] > 0 and busy_servers[stage] < max_num_servers[servers_key]:
+         raise ValueError(f"Census has {queues[stage]} patients waiting for {stage} while only "
+                          f"{busy_servers[stage]} of {max_num_servers[servers_key]} {servers_key} are busy")
+
+   # Zones each bed queue can be served from, as in handle_arrival_event and check_bed_queue
+   bed_queue_zones = {"1": {1, 2}, "2": {2, 3, 4}, "3,4,5": {3, 4}}
+   for key, queue in bed_queue_lists.items():
+      free_zones = [zone for zone in bed_queue_zones[key] if number_of_beds_per_zone.get(zone, 0) > 0]
+      if queue and free_zones:
+         raise ValueError(f"Census has {len(queue)} patients of triage type {key} waiting for a bed "
+                          f"while zones {free_zones} have free beds")
+
+   ambulances = census.get("ambulances", [])
+   if len(ambulances) > 10:
+      raise ValueError(f"Census has {len(ambulances)} ambulances out, but the fleet has 10")
+   for record in ambulances:
+      diverted = record.get("diverted", False)
+      patient = Patient(arrival_type=0)
+      if record.get("triage_type") is not None:
+         patient.assign_triage_type(record["triage_type"])
+         if record.get("complaint") is not None:
+            patient.complaint = record["complaint"]
+      else:
+         patient.assign_triage_type(generate_ambulance_arrival_triage_type())
+      residual = sample_residual_time(lambda: generate_ambulance_trip_time(diverted), record.get("elapsed", 0))
+      fel.append(AmbulanceHospitalArrivalEvent(time=clock + residual, patient=patient, diverted_ambulance=diverted))
+   fel.sort(key=lambda x: x.time, reverse = False)
+
+   return {
+      "clock": clock,
+      "fel": fel,
+      "max_num_servers": max_num_servers,
+      "status_triage_nurses": busy_servers["triage"],
+      "status_workup_doctors": busy_servers["workup"],
+      "status_specialists": busy_servers["specialist"],
+      "total_patients": {"in": 0, "out": 0},
+      "max_queue_lengths": {"Triage": 0, "Bed": 0, "Workup": 0, "Specialist": 0},
+      "number_triage_queue": len(triage_queue_list),
+      "number_waiting_for_bed_queue": sum(len(queue) for queue in bed_queue_lists.values()),
+      "number_workup_queue": sum(len(queue) for queue in workup_queue_lists.values()),
+      "number_specialist_queue": len(specialist_queue_list),
+      "number_of_beds_per_zone": number_of_beds_per_zone,
+      "interrupt_lists": {"2": [], "3,4,5": []},
+      "bed_queue_lists": bed_queue_lists,
+      "workup_queue_lists": workup_queue_lists,
+      "triage_queue_list": triage_queue_list,
+      "specialist_queue_list": specialist_queue_list,
+      "time_weighted_queue": {"Triage": [], "Bed": [], "Workup": [], "Specialist": []},
+      "server_uptime": {"Triage": [], "Workup": [], "Specialist": []},
+      "total_interrupts": 0,
+      "available_ambulances": 10 - len(ambulances),
+      "diverted_ambulances": sum(1 for record in ambulances if record.get("diverted", False)),
+      "time_in_diversion": [],
+   }
+
+def current_queue_lengths():
+   """
+   Returns the number of patients currently waiting at each station, counted from the queue
+   lists. Interrupted patients wait for a doctor and count towards the workup queue.
+   """
+   return {
+      "Triage": len(triage_queue_list),
+      "Bed": bed_queue_length(),
+      "Workup": sum(len(queue) for queue in workup_queue_lists.values()) + sum(len(queue) for queue in interrupt_lists.values()),
+      "Specialist": len(specialist_queue_list),
+   }
+
+def current_busy_servers():
+   """
+   Returns the number of busy servers for each process, counted from the patients in service on
+   the FEL. status_workup_doctors is not increased when a patient leaving the bed queue starts
+   workup, so it can go negative once the bed queue is served.
+   """
+   in_service = {"Triage": 0, "Workup": 0, "Specialist": 0}
+   for event in fel:
+      if isinstance(event, DepartureTriageEvent):
+         in_service["Triage"] += 1
+      elif isinstance(event, DepartureWorkupEvent):
+         in_service["Workup"] += 1
+      elif isinstance(event, DepartureSpecialistEvent):
+         in_service["Specialist"] += 1
+   return in_service
+
+def nowcast(census, horizon=8 * 60, number_of_replications=100, servers=None, beds_per_zone=None, 
+            percentiles=(5, 50, 95), seed=None):
+   """
+   Forecasts the next horizon minutes of the ED from a census (see census_initial_state) by 
+   running short replications that each start from the census. Returns, for every forecast
+   statistic, the mean and the given percentiles across replications.
+   """
+   rng = np.random.default_rng(seed)
+   start = census["time"]
+   end = start + horizon
+   forecasts = []
+
+   for replication in range(number_of_replications):
+      # Remaining service times are resampled for every replication
+      initialize_random_streams(int(rng.integers(2**63)))
+      initial_state = census_initial_state(census, servers, beds_per_zone)
+
+      # Queue lengths and busy servers are integrated over the horizon with the same definitions
+      # as the values reported at the horizon. The state is constant between events, so each
+      # interval up to an event has the state left by the previous event.
+      restore_simulation_state(initial_state)
+      integrated = {'Queues': dict.fromkeys(current_queue_lengths(), 0), 'Busy': dict.fromkeys(current_busy_servers(), 0)}
+      previous = {'Time': start, 'Queues': current_queue_lengths(), 'Busy': current_busy_servers()}
+
+      def integrate_until(time):
+         delta_t = min(time, end) - previous['Time']
+         if delta_t > 0:
+            for kind in ('Queues', 'Busy'):
+               for key, value in previous[kind].items():
+                  integrated[kind][key] += delta_t * value
+            previous['Time'] = min(time, end)
+
+      def observe(event, counters):
+         integrate_until(event.time)
+         previous['Queues'] = current_queue_lengths()
+         previous['Busy'] = current_busy_servers()
+
+      emergency_department_simulation(end, seed=int(rng.integers(2**63)), initial_state=initial_state, 
+                                      stop_condition=lambda: fel[0].time > end, event_observer=observe,
+                                      servers=servers, beds_per_zone=beds_per_zone)
+      integrate_until(end)
+
+      forecasts.append({
+         'Queue Lengths at Horizon': previous['Queues'],
+         'Busy Servers at Horizon': previous['Busy'],
+         'Time Weighted Average Queues': {station: value / horizon for station, value in integrated['Queues'].items()},
+         'Server Utilization Rate': {
+            'Triage': integrated['Busy']['Triage'] / (max_num_servers['nurses'] * horizon) * 100,
+            'Workup': integrated['Busy']['Workup'] / (max_num_servers['doctors'] * horizon) * 100,
+            'Specialist': integrated['Busy']['Specialist'] / (max_num_servers['specialists'] * horizon) * 100,
+         },
+         'Patient Flow': {'Arrivals': total_patients["in"], 'Departures': total_patients["out"]},
+         'Ambulances in Diversion at Horizon': {'Ambulance Diversion': diverted_ambulances},
+      })
+
+   forecast_distributions = {}
+   for metric in forecasts[0].keys():
+      forecast_distributions[metric] = {}
+      for key in forecasts[0][metric].keys():
+         values = np.array([forecast[metric][key] for forecast in forecasts], dtype=float)
+         summary = {'Mean': float(np.mean(values))}
+         for percentile in percentiles:
+            summary[f'P{percentile}'] = float(np.percentile(values, percentile))
+         forecast_distributions[metric][key] = summary
+   return forecast_distributions
+######################################################################
+
+######################## Golden-trace equivalence harness ########################
+# State counters recorded with every event of an event trace, as returned by simulation_counters
+TRACE_COUNTERS = (
+   "triage_queue", "bed_queue", "workup_queue", "specialist_queue", "busy_triage_nurses", 
+   "busy_workup_doctors", "busy_specialists", "available_ambulances", "diverted_ambulances", 
+   "free_beds_zone_1", "free_beds_zone_2", "free_beds_zone_3", "free_beds_zone_4", "patients_in", 
+   "patients_out",
+)
+EVENT_TRACE_DTYPE = np.dtype([("time", "<f8"), ("event_type", "<i2"), ("patient", "<i8")] 
+                             + [(counter, "<i8") for counter in TRACE_COUNTERS])
+
+def record_event_trace(simulation_time, engine=None, seed=0, **engine_arguments):
+   """
+   Runs a seeded replication and records its canonical event trace: the time, event type (-1 for
+   the end of the simulation) and patient of every event, along with the state counters after 
+   it. Patients are numbered in the order they first appear in the trace, so traces of different
+   engines can be compared. The trace is an array with EVENT_TRACE_DTYPE and can be stored with
+   np.save as a golden trace.
+
+   engine defaults to emergency_department_simulation. A candidate engine must take the same 
+   arguments, draw from random_streams the same way, and call event_observer(event, counters) 
+   after every event with counters in the order of TRACE_COUNTERS.
+   """
+   engine = emergency_department_simulation if engine is None else engine
+   records = []
+   patient_numbers = {}
+   traced_patients = [] # Keeps traced patients alive so their id() is never reused
+
+   def observe(event, counters):
+      patient_number = -1
+      if event.patient is not None:
+         if id(event.patient) not in patient_numbers:
+            patient_numbers[id(event.patient)] = len(traced_patients)
+            traced_patients.append(event.patient)
+         patient_number = patient_numbers[id(event.patient)]
+      event_type = -1 if event.type == "End Simulation" else event.type
+      records.append((event.time, event_type, patient_number) + tuple(counters))
+
+   engine(simulation_time, seed=seed, event_observer=observe, **engine_arguments)
+   return np.array(records, dtype=EVENT_TRACE_DTYPE)
+
+def compare_event_traces(reference_trace, candidate_trace, time_tolerance=1e-9):
+   """
+   Returns the first divergence between two event traces, or None if they are equivalent. Event
+   times may differ by up to time_tolerance minutes, every other field must match exactly.
+   """
+   length = min(len(reference_trace), len(candidate_trace))
+   mismatches = {}
+   for field in EVENT_TRACE_DTYPE.names:
+      reference_values = reference_trace[field][:length]
+      candidate_values = candidate_trace[field][:length]
+      if field == "time":
+         mismatches[field] = np.abs(reference_values - candidate_values) > time_tolerance
+      else:
+         mismatches[field] = reference_values != candidate_values
+
+   diverging = np.flatnonzero(np.logical_or.reduce(list(mismatches.values())))
+   if len(diverging) == 0 and len(reference_trace) == len(candidate_trace):
+      return None
+
+   if len(diverging) == 0: # One trace is a prefix of the other
+      index = length
+      fields = ["length"]
+   else:
+      index = int(diverging[0])
+      fields = [field for field, mismatch in mismatches.items() if mismatch[index]]
+
+   def describe(trace):
+      if index >= len(trace):
+         return None
+      return {field: trace[index][field].item() for field in EVENT_TRACE_DTYPE.names}
+
+   return {'Event Index': index,
+           'Diverging Fields': fields,
+           'Reference Event': describe(reference_trace),
+           'Candidate Event': describe(candidate_trace)}
+
+def check_engine_equivalence(candidate_engine, simulation_time, seed=0, reference_trace=None, 
+                             time_tolerance=1e-9, **engine_arguments):
+   """
+   Runs candidate_engine under the same seed as the reference emergency_department_simulation
+   and returns the first divergence of its event trace (None if the traces are equivalent). A 
+   stored golden trace can be given as reference_trace instead of rerunning the reference.
+   """
+   if reference_trace is None:
+      reference_trace = record_event_trace(simulation_time, seed=seed, **engine_arguments)
+   candidate_trace = record_event_trace(simulation_time, engine=candidate_engine, seed=seed, **engine_arguments)
+   return compare_event_traces(reference_trace, candidate_trace, time_tolerance)
+###################################################################################
+
+######################## Time-series recorder ########################
+# Columns sampled by TimeSeriesRecorder
+RECORDER_COLUMNS = (
+   "triage_queue", "bed_queue", "workup_queue", "specialist_queue", "busy_triage_nurses", 
+   "busy_workup_doctors", "busy_specialists", "census_zone_1", "census_zone_2", "census_zone_3", 
+   "census_zone_4", "diverted_ambulances",
+)
+
+class TimeSeriesRecorder():
+    """
+      Event observer (pass it as event_observer to emergency_department_simulation) that samples
+      queue lengths, busy servers, the number of occupied beds per zone and diverted ambulances 
+      every interval simulated minutes from start_time on. Busy servers and occupied beds are
+      counted from the patients, as the status and free-bed counters drift once the bed queue is
+      served. The most recent capacity samples are
+      kept in a preallocated ring buffer, and with profile="hour" or profile="week" every sample
+      is also averaged into an hour-of-day or hour-of-week (day 0 starts at clock 0) profile.
+    """
+    def __init__(self, interval=15, capacity=4096, profile=None, start_time=0):
+        if profile not in {None, "hour", "week"}:
+            raise ValueError(f"Unknown profile {profile!r}, expected None, 'hour' or 'week'")
+        self.interval = interval
+        self.times = np.zeros(capacity)
+        self.samples = np.zeros((capacity, len(RECORDER_COLUMNS)))
+        self.number_of_samples = 0
+        self.next_sample_time = start_time
+        self.state = None
+
+        self.profile = profile
+        profile_bins = {None: 0, "hour": 24, "week": 24 * 7}[profile]
+        self.profile_sums = np.zeros((profile_bins, len(RECORDER_COLUMNS)))
+        self.profile_counts = np.zeros(profile_bins)
+
+    def __call__(self, event, counters):
+        # The state between events is constant, so every sample due before this event sees the
+        # state left by the previous event
+        self.flush(event.time)
+        busy = current_busy_servers()
+        occupied = occupied_beds_per_zone()
+        self.state = (counters[0:4] + (busy["Triage"], busy["Workup"], busy["Specialist"])
+                      + tuple(occupied[zone] for zone in range(1, 5)) + (counters[8],))
+
+    def flush(self, until):
+        """
+        Records the samples due before the time until, e.g. the end of the simulation.
+        """
+        if self.state is None:
+            return
+        while self.next_sample_time < until:
+            index = self.number_of_samples % len(self.times)
+            self.times[index] = self.next_sample_time
+            self.samples[index] = self.state
+            if self.profile is not None:
+                profile_bin = int(self.next_sample_time // 60) % len(self.profile_counts)
+                self.profile_sums[profile_bin] += self.state
+                self.profile_counts[profile_bin] += 1
+            self.number_of_samples += 1
+            self.next_sample_time += self.interval
+
+    def series(self):
+        """
+        Returns the sample times and the samples (one column per RECORDER_COLUMNS entry) kept in
+        the ring buffer, oldest first.
+        """
+        capacity = len(self.times)
+        if self.number_of_samples <= capacity:
+            return self.times[:self.number_of_samples].copy(), self.samples[:self.number_of_samples].copy()
+        order = np.roll(np.arange(capacity), -(self.number_of_samples % capacity))
+        return self.times[order], self.samples[order]
+
+    def profile_means(self):
+        """
+        Returns the average of every column per hour of the day or hour of the week, NaN for
+        hours without samples.
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.profile_sums / self.profile_counts[:, None]
+######################################################################
+
+######################## Analytical queueing-network screener ########################
+# Moments (mean, second moment) of the distributions drawn by the generate_* methods, used by
+# screen_configuration. They mirror the generators and need to be kept in sync with them.
+
+def uniform_moments(low, high):
+   return ((low + high) / 2, (low**2 + low*high + high**2) / 3)
+
+def triangular_moments(left, mode, right):
+   mean = (left + mode + right) / 3
+   variance = (left**2 + mode**2 + right**2 - left*mode - left*right - mode*right) / 18
+   return (mean, variance + mean**2)
+
+def constant_moments(value):
+   return (value, value**2)
+
+# Ambulance triage types from generate_ambulance_arrival_triage_type (its type 3 threshold is
+# r <= 85, so type 4 is never generated) and walk-in triage types from generate_walk_in_triage_type
+AMBULANCE_TRIAGE_PROBABILITIES = {1: 0.2, 2: 0.35, 3: 0.45, 4: 0}
+WALK_IN_TRIAGE_PROBABILITIES = {3: 0.33333, 4: 0.33334, 5: 0.33333}
+
+# Chief complaint probabilities from Patient.assign_triage_type
+COMPLAINT_PROBABILITIES = {
+   1: {1: 0.5, 2: 0.5},
+   2: {1: 0.5, 2: 0.5},
+   3: {1: 1},
+   4: {1: 0.5, 2: 0.5},
+   5: {1: 1},
+}
+
+# Triage service time by triage type from generate_triage_time
+TRIAGE_TIME_MOMENTS = {
+   3: uniform_moments(0.75, 2.25),
+   4: uniform_moments(7.5, 11.25),
+   5: uniform_moments(7.5, 11.25),
+}
+
+# Workup service time by (triage type, complaint) from generate_workup_service_time
+WORKUP_TIME_MOMENTS = {
+   (1, 1): uniform_moments(5, 12),
+   (1, 2): uniform_moments(2, 5),
+   (2, 1): uniform_moments(5, 15),
+   (2, 2): constant_moments(2),
+   (3, 1): uniform_moments(5, 10),
+   (4, 1): constant_moments(2),
+   (4, 2): constant_moments(2),
+   (5, 1): uniform_moments(5, 10),
+}
+
+# Procedures performed by (triage type, complaint) from generate_procedure_time, as
+# (probability, procedure time moments) pairs
+PROCEDURE_ROUTING = {
+   (1, 1): [(0.9, uniform_moments(3, 5)), (0.8, triangular_moments(10, 25, 50))],
+   (1, 2): [(0.95, uniform_moments(7, 10)), (0.6, triangular_moments(30, 45, 90))],
+   (2, 1): [(0.9, uniform_moments(10, 25)), (0.8, uniform_moments(2, 5))],
+   (2, 2): [(0.9, uniform_moments(5, 10)), (0.7, uniform_moments(2, 3))],
+   (3, 1): [(0.8, uniform_moments(3, 5)), (0.7, uniform_moments(5, 15))],
+   (4, 1): [(0.75, triangular_moments(10, 15, 25)), (0.3, uniform_moments(2, 5))],
+   (4, 2): [(0.6, uniform_moments(2, 3)), (0.3, uniform_moments(5, 10))],
+   (5, 1): [(0.9, uniform_moments(2, 5))],
+}
+
+# Ambulance trip times from handle_ambulance_departure_event
+AMBULANCE_TRAVEL_MOMENTS = triangular_moments(5, 10, 20)
+AMBULANCE_PROCESS_MOMENTS = uniform_moments(4, 10)
+AMBULANCE_DIVERTED_TRAVEL_MOMENTS = triangular_moments(10, 15, 25)
+
+def procedure_time_moments(procedures):
+   """
+   Moments of the total specialist time of a patient receiving each procedure independently
+   with its probability.
+   """
+   mean = sum(p * moments[0] for p, moments in procedures)
+   second_moment = (sum(p * moments[1] for p, moments in procedures) + mean**2 
+                    - sum((p * moments[0])**2 for p, moments in procedures))
+   return (mean, second_moment)
+
+def erlang_b(c, a):
+   """
+   Blocking probability of an M/G/c/c loss system with offered load a.
+   """
+   b = 1
+   for k in range(1, c + 1):
+      b = a * b / (k + a * b)
+   return b
+
+def erlang_c(c, a):
+   """
+   Probability of waiting in an M/M/c queue with offered load a (requires a < c).
+   """
+   b = erlang_b(c, a)
+   return b / (1 - (a / c) * (1 - b))
+
+def multi_server_station(arrival_rate, moments, c, arrival_scv=1):
+   """
+   Allen-Cunneen approximation of a G/G/c station, given the arrival rate (patients / minute), 
+   service time moments and number of servers. Returns the utilization, the probability of
+   waiting, the average wait in queue and the average queue length.
+   """
+   if arrival_rate == 0:
+      return {'Utilization': 0, 'Probability of Waiting': 0, 'Wait': 0, 'Queue': 0}
+   mean, second_moment = moments
+   a = arrival_rate * mean
+   if a >= c:
+      return {'Utilization': a / c, 'Probability of Waiting': 1, 'Wait': math.inf, 'Queue': math.inf}
+   service_scv = second_moment / mean**2 - 1
+   probability_of_waiting = erlang_c(c, a)
+   wait = probability_of_waiting / (c / mean - arrival_rate) * (arrival_scv + service_scv) / 2
+   return {'Utilization': a / c, 'Probability of Waiting': probability_of_waiting, 
+           'Wait': wait, 'Queue': arrival_rate * wait}
+
+def mix_moments(class_rates, class_moments):
+   """
+   Service time moments of a station serving several patient classes with the given rates.
+   """
+   total_rate = sum(class_rates.values())
+   if total_rate == 0:
+      return (0, 0)
+   return (sum(rate * class_moments[key][0] for key, rate in class_rates.items()) / total_rate,
+           sum(rate * class_moments[key][1] for key, rate in class_rates.items()) / total_rate)
+
+def evaluate_queueing_network(walk_in_rate, ambulance_rate, servers, beds_per_zone, fleet_size=10):
+   """
+   Approximates the steady state of the ED for constant arrival rates (patients / minute) as a 
+   network of triage, bed, workup and specialist stations plus the ambulance fleet.
+
+   Beds are pooled into zones 1-2 (triage types 1 and 2) and zones 3-4 (triage types 3, 4 and 5)
+   and are held from bed assignment until the specialist departure. Bed holding times depend on 
+   the workup and specialist waits, and ambulance diversion (types 3 and 4 are diverted while 5 or
+   more patients wait for a bed) depends on the bed queue, so the diversion probability is the
+   fixed point of evaluating the network for a given diversion probability. More diversion means
+   less load, so the fixed point is found by bisection.
+   """
+   procedure_moments = {key: procedure_time_moments(procedures) for key, procedures in PROCEDURE_ROUTING.items()}
+   bed_pools = {
+      "Bed (Zones 1-2)": ({1, 2}, beds_per_zone[1] + beds_per_zone[2]),
+      "Bed (Zones 3-4)": ({3, 4, 5}, beds_per_zone[3] + beds_per_zone[4]),
+   }
+
+   def evaluate_network(diversion_probability):
+      # Ambulance fleet as a loss system, calls finding no available ambulance are lost
+      diverted_share = (AMBULANCE_TRIAGE_PROBABILITIES[3] + AMBULANCE_TRIAGE_PROBABILITIES[4]) * diversion_probability
+      trip_time = ((1 - diverted_share) * (2 * AMBULANCE_TRAVEL_MOMENTS[0] + AMBULANCE_PROCESS_MOMENTS[0])
+                   + diverted_share * (AMBULANCE_TRAVEL_MOMENTS[0] + AMBULANCE_PROCESS_MOMENTS[0] 
+                                       + AMBULANCE_DIVERTED_TRAVEL_MOMENTS[0]))
+      fleet_blocking = erlang_b(fleet_size, ambulance_rate * trip_time)
+      dispatch_rate = ambulance_rate * (1 - fleet_blocking)
+
+      # Rate of admitted patients by (triage type, complaint)
+      class_rates = {key: 0 for key in WORKUP_TIME_MOMENTS}
+      for triage_type, p in AMBULANCE_TRIAGE_PROBABILITIES.items():
+         admitted = dispatch_rate * p * (1 - diversion_probability if triage_type in {3, 4} else 1)
+         for complaint, q in COMPLAINT_PROBABILITIES[triage_type].items():
+            class_rates[(triage_type, complaint)] += admitted * q
+      for triage_type, p in WALK_IN_TRIAGE_PROBABILITIES.items():
+         for complaint, q in COMPLAINT_PROBABILITIES[triage_type].items():
+            class_rates[(triage_type, complaint)] += walk_in_rate * p * q
+
+      stations = {
+         "Triage": multi_server_station(walk_in_rate, mix_moments(WALK_IN_TRIAGE_PROBABILITIES, TRIAGE_TIME_MOMENTS), 
+                                        servers["nurses"]),
+         "Workup": multi_server_station(sum(class_rates.values()), mix_moments(class_rates, WORKUP_TIME_MOMENTS), 
+                                        servers["doctors"]),
+         "Specialist": multi_server_station(sum(class_rates.values()), mix_moments(class_rates, procedure_moments), 
+                                            servers["specialists"]),
+      }
+
+      # Bed holding time covers the workup and specialist stages including their queues
+      holding_moments = {}
+      for key in class_rates:
+         mean = (stations["Workup"]["Wait"] + WORKUP_TIME_MOMENTS[key][0] 
+                 + stations["Specialist"]["Wait"] + procedure_moments[key][0])
+         holding_moments[key] = constant_moments(mean) if math.isinf(mean) else (mean, 2 * mean**2)
+      for pool, (triage_types, beds) in bed_pools.items():
+         pool_rates = {key: rate for key, rate in class_rates.items() if key[0] in triage_types}
+         stations[pool] = multi_server_station(sum(pool_rates.values()), mix_moments(pool_rates, holding_moments), beds)
+
+      stations["Ambulance"] = {'Utilization': dispatch_rate * trip_time / fleet_size, 'Probability of Waiting': 0, 
+                               'Wait': 0, 'Queue': 0}
+
+      # Probability that 5 or more patients wait for a bed in zones 3-4, P(Nq >= 5) of an M/M/c queue
+      bed_station = stations["Bed (Zones 3-4)"]
+      if bed_station["Utilization"] >= 1:
+         resulting_diversion_probability = 1
+      else:
+         resulting_diversion_probability = bed_station["Probability of Waiting"] * bed_station["Utilization"]**5
+      return stations, fleet_blocking, resulting_diversion_probability
+
+   low, high = 0, 1
+   if evaluate_network(0)[2] == 0:
+      high = 0
+   while high - low > 1e-9:
+      middle = (low + high) / 2
+      if evaluate_network(middle)[2] > middle:
+         low = middle
+      else:
+         high = middle
+
+   # Report the network on the stable side of the fixed point
+   stations, fleet_blocking, resulting_diversion_probability = evaluate_network(high)
+   return {'Stations': stations, 
+           'Ambulance Diversion Probability': high,
+           'Lost Ambulance Call Probability': fleet_blocking}
+
+def screen_configuration(servers=None, beds_per_zone=None, fleet_size=10, utilization_margin=0.85):
+   """
+   Near-instant approximation of a staffing configuration, used to decide whether it is worth
+   simulating. The queueing network is evaluated for the arrival rates of every hour of the day
+   (pointwise stationary approximation) and for the daily average rates.
+
+   A configuration is "infeasible" if any station is overloaded on the daily average rates, 
+   "feasible" if every station stays below utilization_margin in every hour, and "borderline" 
+   otherwise, in which case it should be simulated.
+   """
+   servers = DEFAULT_MAX_NUM_SERVERS if servers is None else servers
+   beds_per_zone = DEFAULT_BEDS_PER_ZONE if beds_per_zone is None else beds_per_zone
+
+   # Arrival rates at the middle of each hour, in patients / minute
+   hourly_rates = [(arrival_rate(hour * 60 + 30, 1) / 60, arrival_rate(hour * 60 + 30, 0) / 60) for hour in range(24)]
+   hourly_results = [evaluate_queueing_network(walk_in_rate, ambulance_rate, servers, beds_per_zone, fleet_size)
+                     for walk_in_rate, ambulance_rate in hourly_rates]
+   daily_results = evaluate_queueing_network(sum(rates[0] for rates in hourly_rates) / 24, 
+                                             sum(rates[1] for rates in hourly_rates) / 24, 
+                                             servers, beds_per_zone, fleet_size)
+
+   stations = daily_results['Stations'].keys()
+   average_utilization = {station: daily_results['Stations'][station]['Utilization'] for station in stations}
+   peak_utilization = {station: max(result['Stations'][station]['Utilization'] for result in hourly_results) 
+                       for station in stations}
+
+   if any(utilization >= 1 for utilization in average_utilization.values()):
+      classification = "infeasible"
+   elif all(utilization < utilization_margin for utilization in peak_utilization.values()):
+      classification = "feasible"
+   else:
+      classification = "borderline"
+
+   return {'Classification': classification,
+           'Average Utilization': average_utilization,
+           'Peak Hour Utilization': peak_utilization,
+           'Average Queue Lengths': {station: daily_results['Stations'][station]['Queue'] for station in stations},
+           'Average Waits': {station: daily_results['Stations'][station]['Wait'] for station in stations},
+           'Ambulance Diversion Probability': daily_results['Ambulance Diversion Probability'],
+           'Lost Ambulance Call Probability': daily_results['Lost Ambulance Call Probability']}
+######################################################################################
+
+######################## Distributed replications ########################
+# Environment variable the command line reads the authkey from when no --authkey-file is given
+AUTHKEY_ENVIRONMENT_VARIABLE = "HOSPITAL_SIM_AUTHKEY"
+
+def check_authkey(authkey):
+   """
+   Messages between coordinator and workers are pickled, so both sides must authenticate.
+   """
+   if not isinstance(authkey, bytes) or not authkey:
+      raise ValueError("Distributed replications need a shared, non-empty authkey (bytes)")
+
+def read_authkey(path=None):
+   """
+   Reads the authkey from a file (surrounding whitespace stripped) or, without a path, from the
+   AUTHKEY_ENVIRONMENT_VARIABLE environment variable, so it never appears on the command line.
+   """
+   if path is not None:
+      with open(path, "rb") as file:
+         authkey = file.read().strip()
+   else:
+      authkey = os.environ.get(AUTHKEY_ENVIRONMENT_VARIABLE, "").encode()
+   check_authkey(authkey)
+   return authkey
+
+def parse_address(address):
+   """
+   Parses a HOST:PORT command line address into the (host, port) tuple used by the listener.
+   """
+   host, separator, port = address.rpartition(":")
+   if not separator or not host or not port.isdigit():
+      raise ValueError(f"Expected an address of the form HOST:PORT, got {address!r}")
+   return (host, int(port))
+
+class ReplicationCoordinator():
+    """
+      Hands out work units (keyword arguments of emergency_department_simulation, i.e. a 
+      configuration and a seed) to replication workers connecting over TCP, and collects the 
+      result dicts they stream back. Units leased to a worker that disconnects, reports an error,
+      or does not come back within lease_timeout seconds are handed out again, up to max_attempts
+      times in total.
+
+      Connections are authenticated with authkey. The coordinator only listens on localhost 
+      unless another address (e.g. ("0.0.0.0", 50000)) is given.
+    """
+    def __init__(self, work_units, authkey, address=("127.0.0.1", 0), lease_timeout=1800, max_attempts=3):
+        check_authkey(authkey)
+        self.work_units = list(work_units)
+        self.pending = list(range(len(self.work_units)))
+        self.leases = {} # unit id -> (worker id, lease deadline)
+        self.attempts = dict.fromkeys(range(len(self.work_units)), 0)
+        self.results = {}
+        self.failure = None
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        if not self.work_units:
+            self.finished.set()
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+
+    def serve(self):
+        """
+        Serves workers until every work unit has a result, then returns the results in the
+        order of the work units. Raises RuntimeError if a work unit failed max_attempts times.
+        """
+        threading.Thread(target=self.accept_workers, daemon=True).start()
+        # Leases are also checked here, as a worker that hangs without disconnecting or 
+        # requesting work would otherwise keep its units leased forever
+        while not self.finished.wait(timeout=min(self.lease_timeout, 10)):
+            with self.lock:
+                self.reclaim_expired_leases()
+        self.listener.close()
+        if self.failure is not None:
+            unit_id, reason = self.failure
+            raise RuntimeError(f"Work unit {unit_id} ({self.work_units[unit_id]}) failed after "
+                               f"{self.attempts[unit_id]} attempts:\n{reason}")
+        return [self.results[unit_id] for unit_id in range(len(self.work_units))]
+
+    def accept_workers(self):
+        worker_ids = count()
+        while not self.finished.is_set():
+            try:
+                connection = self.listener.accept()
+            except AuthenticationError:
+                continue
+            except OSError: # Listener closed once all results are in
+                return
+            threading.Thread(target=self.serve_worker, args=(connection, next(worker_ids)), daemon=True).start()
+
+    def serve_worker(self, connection, worker_id):
+        """
+        Answers the requests of one worker: ("request",) is answered with ("work", unit id, unit),
+        ("wait", None, None) or ("done", None, None), ("result", unit id, result) records a result
+        and ("error", unit id, traceback) reports a failed work unit.
+        """
+        with connection:
+            while True:
+                try:
+                    message = connection.recv()
+                    if message[0] == "request":
+                        connection.send(self.lease_work_unit(worker_id))
+                    elif message[0] == "result":
+                        self.record_result(message[1], message[2])
+                    else:
+                        self.record_error(message[1], message[2])
+                except (EOFError, OSError):
+                    self.release_leases(worker_id) # Lost worker, hand its units out again
+                    return
+
+    def lease_work_unit(self, worker_id):
+        with self.lock:
+            self.reclaim_expired_leases()
+            if self.finished.is_set():
+                return ("done", None, None)
+            if not self.pending:
+                return ("wait", None, None)
+            unit_id = self.pending.pop(0)
+            self.attempts[unit_id] += 1
+            self.leases[unit_id] = (worker_id, time.monotonic() + self.lease_timeout)
+            return ("work", unit_id, self.work_units[unit_id])
+
+    def reclaim_expired_leases(self):
+        """
+        Hands out again the work units whose lease has expired. Must be called with the lock held.
+        """
+        now = time.monotonic()
+        for unit_id, (lease_worker_id, deadline) in list(self.leases.items()):
+            if deadline < now:
+                del self.leases[unit_id]
+                self.retry(unit_id, f"Lease expired after {self.lease_timeout} s")
+
+    def record_result(self, unit_id, result):
+        with self.lock:
+            self.leases.pop(unit_id, None)
+            if unit_id in self.pending: # Result arrived after the lease expired
+                self.pending.remove(unit_id)
+            self.results.setdefault(unit_id, result)
+            if len(self.results) == len(self.work_units):
+                self.finished.set()
+
+    def record_error(self, unit_id, reason):
+        with self.lock:
+            if self.leases.pop(unit_id, None) is not None:
+                self.retry(unit_id, reason)
+
+    def release_leases(self, worker_id):
+        with self.lock:
+            for unit_id, (lease_worker_id, deadline) in list(self.leases.items()):
+                if lease_worker_id == worker_id:
+                    del self.leases[unit_id]
+                    self.retry(unit_id, "Worker disconnected while running the work unit")
+
+    def retry(self, unit_id, reason):
+        """
+        Hands a work unit out again, or gives up on the whole run once it has failed max_attempts
+        times. Must be called with the lock held.
+        """
+        if unit_id in self.results:
+            return
+        if self.attempts[unit_id] >= self.max_attempts:
+            self.failure = (unit_id, reason)
+            self.finished.set()
+        else:
+            self.pending.append(unit_id)
+
+def run_replication_worker(address, authkey, poll_interval=1.0):
+   """
+   Connects to a ReplicationCoordinator at address and runs the work units it hands out until
+   all of them are done, sending back each result as soon as it is available. A work unit that
+   raises is reported back to the coordinator with its traceback. Returns the number of work 
+   units this worker completed. Run one worker per process, since the simulation state is global.
+   """
+   check_authkey(authkey)
+   completed = 0
+   try:
+      with Client(address, authkey=authkey) as connection:
+         while True:
+            connection.send(("request",))
+            status, unit_id, unit = connection.recv()
+            if status == "done":
+               break
+            if status == "wait": # Remaining units are leased to other workers
+               time.sleep(poll_interval)
+               continue
+            try:
+               result = emergency_department_simulation(**unit)
+            except Exception:
+               connection.send(("error", unit_id, traceback.format_exc()))
+               continue
+            connection.send(("result", unit_id, result))
+            completed += 1
+   except (EOFError, ConnectionError): # Coordinator shut down once all results were in
+      pass
+   return completed
+##########################################################################
+
+def main(number_of_replications=10, antithetic=False, seed=None, coordinator_address=None, authkey=None):
+   """
+   Runs the replications and averages every statistic across them. With antithetic=True the 
+   replications are run as antithetic pairs (replication 2k+1 uses 1 - U for every uniform 
+   replication 2k drew) and the variance reduction achieved for each statistic is reported 
+   alongside the pair-averaged estimates.
+
+   If coordinator_address is given, the replications are not run locally but handed out by a
+   ReplicationCoordinator listening on that address to workers started with run_replication_worker,
+   all sharing authkey.
+   """
    simulation_time = 24 * 60 * 180
-   accumulated_results = []
+   work_units = []
+
+   if antithetic and number_of_replications % 2 != 0:
+      raise ValueError("Antithetic replications run in pairs, number_of_replications must be even")
+
+   # Both replications of an antithetic pair share a seed
+   number_of_seeds = number_of_replications // 2 if antithetic else number_of_replications
+   replication_seeds = np.random.SeedSequence(seed).generate_state(number_of_seeds)
 
    for i in range(number_of_replications):
-      sim_results = emergency_department_simulation(simulation_time)
-      accumulated_results.append(sim_results)
+      if antithetic:
+         work_units.append({'simulation_time': simulation_time, 'seed': int(replication_seeds[i // 2]), 
+                            'antithetic': (i % 2 == 1)})
+      else:
+         work_units.append({'simulation_time': simulation_time, 'seed': int(replication_seeds[i])})
+
+   if coordinator_address is None:
+      accumulated_results = [emergency_department_simulation(**work_unit) for work_unit in work_units]
+   else:
+      accumulated_results = ReplicationCoordinator(work_units, authkey, coordinator_address).serve()
 
     # Calculate average across all simulations
    average_results = {}
@@ -828,10 +2080,51 @@ def main():
          for key in accumulated_results[0][metric].keys()
       }  
 
+   if antithetic:
+      # Variance of the pair-averaged estimator relative to averaging two independent replications
+      for metric in accumulated_results[0].keys():
+         variance_reduction = {}
+         for key in accumulated_results[0][metric].keys():
+            values = np.array([result[metric][key] for result in accumulated_results], dtype=float)
+            pair_averages = (values[0::2] + values[1::2]) / 2
+            independent_variance = np.var(values, ddof=1) / 2
+            if len(pair_averages) < 2 or independent_variance == 0:
+               # Not measurable from a single pair or a statistic that never varies
+               variance_reduction[key] = math.nan
+            else:
+               variance_reduction[key] = float((1 - np.var(pair_averages, ddof=1) / independent_variance) * 100)
+         average_results[f"{metric} - Antithetic Variance Reduction (%)"] = variance_reduction
+
    return average_results
 
 if __name__ == '__main__':
-   statistics = main()
-   for key,value in statistics.items():
-       print(f'Statistic: {key}\nProcess/Server: {value}\n\n')
+   parser = argparse.ArgumentParser(description="Emergency department simulation")
+   parser.add_argument("--replications", type=int, default=10, help="number of replications")
+   parser.add_argument("--antithetic", action="store_true", help="run the replications as antithetic pairs")
+   parser.add_argument("--seed", type=int, default=None, help="seed for the replication random streams")
+   distributed = parser.add_mutually_exclusive_group()
+   distributed.add_argument("--coordinate", metavar="HOST:PORT", default=None, 
+                            help="hand the replications out to workers connecting to this address")
+   distributed.add_argument("--worker", metavar="HOST:PORT", default=None, 
+                            help="run replications for the coordinator at this address")
+   parser.add_argument("--authkey-file", default=None, 
+                       help=f"file holding the shared authkey (default: the {AUTHKEY_ENVIRONMENT_VARIABLE} environment variable)")
+   arguments = parser.parse_args()
+
+   address = authkey = None
+   if arguments.coordinate is not None or arguments.worker is not None:
+      try:
+         address = parse_address(arguments.coordinate or arguments.worker)
+         authkey = read_authkey(arguments.authkey_file)
+      except (ValueError, OSError) as error:
+         parser.error(str(error))
+
+   if arguments.worker is not None:
+      completed = run_replication_worker(address, authkey)
+      print(f"Completed {completed} work units")
+   else:
+      statistics = main(number_of_replications=arguments.replications, antithetic=arguments.antithetic, 
+                        seed=arguments.seed, coordinator_address=address, authkey=authkey)
+      for key,value in statistics.items():
+          print(f'Statistic: {key}\nProcess/Server: {value}\n\n')
    
\ No newline at end of file
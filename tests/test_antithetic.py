@@ -0,0 +1,43 @@
+import numpy as np
+
+import hospital_sim
+
+SIMULATION_TIME = 24 * 60 * 3
+
+def record_draws(monkeypatch, antithetic):
+    draws = {}
+    random = hospital_sim.RandomStream.random
+    def logged_random(stream):
+        value = random(stream)
+        draws.setdefault(id(stream), []).append(value)
+        return value
+    monkeypatch.setattr(hospital_sim.RandomStream, "random", logged_random)
+    hospital_sim.emergency_department_simulation(SIMULATION_TIME, seed=7, antithetic=antithetic)
+    return {process: np.array(draws.get(id(stream), [])) for process, stream in hospital_sim.random_streams.items()}
+
+def test_antithetic_pair_mirrors_arrival_triage_and_ambulance_draws(monkeypatch):
+    draws = record_draws(monkeypatch, antithetic=False)
+    antithetic_draws = record_draws(monkeypatch, antithetic=True)
+
+    for process in ("walk_in_arrivals", "ambulance_arrivals", "triage", "ambulance"):
+        length = min(len(draws[process]), len(antithetic_draws[process]))
+        assert length > 100
+        np.testing.assert_allclose(draws[process][:length] + antithetic_draws[process][:length], 1)
+
+def test_generators_draw_a_fixed_number_of_uniforms(monkeypatch):
+    hospital_sim.initialize_random_streams(seed=1)
+    drawn = []
+    random = hospital_sim.RandomStream.random
+    monkeypatch.setattr(hospital_sim.RandomStream, "random", lambda stream: drawn.append(1) or random(stream))
+
+    for triage_type, complaint in [(1, 1), (1, 2), (2, 1), (2, 2), (3, 1), (4, 1), (4, 2), (5, 1)]:
+        patient = hospital_sim.Patient(arrival_type=1, triage_type=triage_type, complaint=complaint)
+        drawn.clear()
+        hospital_sim.generate_workup_service_time(patient)
+        assert len(drawn) == 1
+        drawn.clear()
+        hospital_sim.generate_procedure_time(patient)
+        assert len(drawn) == 13
+        drawn.clear()
+        patient.assign_triage_type(triage_type)
+        assert len(drawn) == 1
@@ -0,0 +1,52 @@
+import math
+
+import numpy as np
+import pytest
+
+import hospital_sim
+
+def make_trace(times, arrival_types=None):
+    trace = np.zeros(len(times), dtype=hospital_sim.ARRIVAL_TRACE_DTYPE)
+    trace["time"] = times
+    trace["arrival_type"] = 1 if arrival_types is None else arrival_types
+    trace["triage_type"] = 3
+    trace["complaint"] = 1
+    return trace
+
+def replayed_arrivals(arrival_trace, simulation_time):
+    arrivals = []
+    def observe(event, counters):
+        if isinstance(event, (hospital_sim.WalkInArrivalEvent, hospital_sim.AmbulanceHospitalArrivalEvent)):
+            arrivals.append((event.time, event.patient.arrival_type, event.patient.triage_type))
+    hospital_sim.emergency_department_simulation(simulation_time, arrival_trace=arrival_trace, seed=0,
+                                                 warm_up_time=0, event_observer=observe)
+    return arrivals
+
+def test_saved_trace_is_replayed_in_time_order(tmp_path):
+    path = tmp_path / "arrivals.npy"
+    hospital_sim.save_arrival_trace(path, times=[30, 10, 20], arrival_types=[1, 0, 1], triage_types=[4, 2, 5],
+                                    complaints=[1, 2, 1])
+
+    assert replayed_arrivals(path, 60) == [(10, 0, 2), (20, 1, 5), (30, 1, 4)]
+
+def test_trace_with_the_wrong_dtype_is_rejected(tmp_path):
+    trace = np.array([(10.0, 1)], dtype=[("time", "<f8"), ("arrival_type", "u1")])
+    with pytest.raises(ValueError):
+        hospital_sim.emergency_department_simulation(60, arrival_trace=trace)
+
+    np.save(tmp_path / "arrivals.npy", trace)
+    with pytest.raises(ValueError):
+        hospital_sim.emergency_department_simulation(60, arrival_trace=tmp_path / "arrivals.npy")
+
+@pytest.mark.parametrize("times", [[100, 50, 10], [10, 20, 15, 30]])
+def test_unsorted_trace_is_rejected_within_and_across_chunks(times):
+    with pytest.raises(ValueError):
+        list(hospital_sim.stream_arrival_trace(make_trace(times), chunk_size=2))
+    with pytest.raises(ValueError):
+        hospital_sim.emergency_department_simulation(200, arrival_trace=make_trace(times))
+
+def test_empty_trace_reports_no_queue_time_per_customer():
+    results = hospital_sim.emergency_department_simulation(60, arrival_trace=make_trace([]), warm_up_time=0)
+
+    assert all(math.isnan(value) for value in results["Average Queue Time Per Customer"].values())
+    assert results["Time Weighted Average Queues"]["Triage"] == 0
@@ -0,0 +1,50 @@
+import pytest
+
+import hospital_sim
+
+def census(*patients, ambulances=()):
+    return {"time": 14 * 60, "patients": list(patients), "ambulances": list(ambulances)}
+
+@pytest.mark.parametrize("patients", [
+    # A nurse is free while a patient waits for triage
+    [{"stage": "triage queue"}, {"stage": "triage"}],
+    # A doctor is free while a patient waits for workup
+    [{"stage": "workup queue", "triage_type": 3, "zone": 3}, {"stage": "workup", "triage_type": 3, "zone": 4}],
+    # A specialist is free while a patient waits for one
+    [{"stage": "specialist queue", "triage_type": 3, "zone": 3}],
+    # Zone 4 has free beds while a type 3 patient waits for a bed
+    [{"stage": "bed queue", "triage_type": 3}],
+])
+def test_census_with_idle_resources_is_rejected(patients):
+    hospital_sim.initialize_random_streams(seed=0)
+    with pytest.raises(ValueError):
+        hospital_sim.census_initial_state(census(*patients))
+
+def test_census_with_more_ambulances_than_the_fleet_is_rejected():
+    hospital_sim.initialize_random_streams(seed=0)
+    with pytest.raises(ValueError):
+        hospital_sim.census_initial_state(census(ambulances=[{"elapsed": 5}] * 11))
+
+def test_ambulance_patients_get_ambulance_triage_types(monkeypatch):
+    hospital_sim.initialize_random_streams(seed=0)
+    monkeypatch.setattr(hospital_sim, "generate_walk_in_triage_type", lambda: 5)
+    monkeypatch.setattr(hospital_sim, "generate_ambulance_arrival_triage_type", lambda: 2)
+    state = hospital_sim.census_initial_state(census({"stage": "workup", "arrival_type": 0, "zone": 2}))
+    patients = [event.patient for event in state["fel"] if isinstance(event, hospital_sim.DepartureWorkupEvent)]
+    assert [patient.triage_type for patient in patients] == [2]
+
+def test_nowcast_of_a_busy_ed_reports_no_negative_busy_servers():
+    busy_ed = census(
+        *[{"stage": "triage queue", "elapsed": 5}] * 3, *[{"stage": "triage", "elapsed": 3}] * 2,
+        *[{"stage": "workup", "triage_type": 3, "zone": 3, "elapsed": 4}] * 2,
+        *[{"stage": "workup queue", "triage_type": 4, "zone": 3, "elapsed": 10}] * 8,
+        *[{"stage": "workup queue", "triage_type": 4, "zone": 4, "elapsed": 10}] * 10,
+        *[{"stage": "specialist", "triage_type": 1, "complaint": 1, "zone": 1, "elapsed": 30}] * 5,
+        *[{"stage": "specialist queue", "triage_type": 1, "zone": 1, "elapsed": 2}] * 3,
+        *[{"stage": "bed queue", "triage_type": 3, "elapsed": 20}] * 4,
+        ambulances=[{"elapsed": 10}, {"elapsed": 5, "diverted": True}])
+    forecast = hospital_sim.nowcast(busy_ed, horizon=4 * 60, number_of_replications=20, seed=1)
+
+    for statistic in ("Busy Servers at Horizon", "Server Utilization Rate"):
+        for summary in forecast[statistic].values():
+            assert summary["P5"] >= 0
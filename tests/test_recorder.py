@@ -0,0 +1,32 @@
+import numpy as np
+
+import hospital_sim
+
+def test_recorder_counts_occupied_beds_from_patients():
+    census = {"time": 0, "patients": [
+        {"stage": "workup", "triage_type": 1, "zone": 1},
+        {"stage": "workup", "triage_type": 2, "zone": 2},
+        *[{"stage": "specialist", "triage_type": 3, "zone": 3}] * 4,
+        {"stage": "workup queue", "triage_type": 4, "zone": 4},
+    ]}
+    hospital_sim.initialize_random_streams(seed=1)
+    state = hospital_sim.census_initial_state(census)
+    # The first event dispatches an ambulance, which leaves the beds as in the census
+    assert isinstance(min(state["fel"], key=lambda event: event.time), hospital_sim.DepartureAmbulanceEvent)
+    recorder = hospital_sim.TimeSeriesRecorder(interval=1)
+    hospital_sim.emergency_department_simulation(60, initial_state=state, event_observer=recorder, seed=0,
+                                                 stop_condition=lambda: hospital_sim.fel[0].time > 3)
+    recorder.flush(3)
+
+    _, samples = recorder.series()
+    census_columns = [hospital_sim.RECORDER_COLUMNS.index(f"census_zone_{zone}") for zone in range(1, 5)]
+    assert samples[0, census_columns].tolist() == [1, 1, 4, 1]
+
+def test_recorder_never_reports_negative_census_or_busy_servers():
+    # Over 30 days the bed queue is served, after which the free-bed and busy-doctor counters drift
+    recorder = hospital_sim.TimeSeriesRecorder(interval=60, capacity=24 * 30)
+    hospital_sim.emergency_department_simulation(24 * 60 * 30, seed=3, event_observer=recorder)
+
+    _, samples = recorder.series()
+    assert len(samples) == 24 * 30
+    assert np.all(samples >= 0)
@@ -0,0 +1,130 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+from multiprocessing.connection import Client
+
+import pytest
+
+import hospital_sim
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "hospital_sim.py")
+AUTHKEY = b"test-authkey"
+SIMULATION_TIME = 24 * 60 * 2
+
+def run_worker(address, results):
+    results.put(hospital_sim.run_replication_worker(address, AUTHKEY, poll_interval=0.05))
+
+def lease_and_die(address):
+    # Leases a work unit and exits without returning its result
+    connection = Client(address, authkey=AUTHKEY)
+    connection.send(("request",))
+    connection.recv()
+    os._exit(1)
+
+def serve_in_thread(coordinator):
+    outcome = {}
+    def serve():
+        try:
+            outcome["results"] = coordinator.serve()
+        except Exception as error:
+            outcome["error"] = error
+    thread = threading.Thread(target=serve)
+    thread.start()
+    return thread, outcome
+
+def run_workers(address, number_of_workers):
+    context = multiprocessing.get_context("spawn")
+    completed = context.Queue()
+    workers = [context.Process(target=run_worker, args=(address, completed)) for _ in range(number_of_workers)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=120)
+    return [completed.get(timeout=10) for _ in workers]
+
+def test_workers_complete_every_unit_when_a_worker_is_lost():
+    work_units = [{"simulation_time": SIMULATION_TIME, "seed": seed} for seed in range(6)]
+    coordinator = hospital_sim.ReplicationCoordinator(work_units, AUTHKEY)
+    thread, outcome = serve_in_thread(coordinator)
+
+    lost_worker = multiprocessing.get_context("spawn").Process(target=lease_and_die, args=(coordinator.address,))
+    lost_worker.start()
+    lost_worker.join(timeout=60)
+    assert lost_worker.exitcode == 1
+
+    completed = run_workers(coordinator.address, 3)
+    thread.join(timeout=60)
+
+    assert sum(completed) == len(work_units)
+    expected = [hospital_sim.emergency_department_simulation(**unit) for unit in work_units]
+    assert outcome["results"] == expected
+
+def test_failing_unit_is_retried_then_reported():
+    work_units = [{"simulation_time": SIMULATION_TIME, "seed": 0}, {"simulation_time": SIMULATION_TIME, "unknown": 1}]
+    coordinator = hospital_sim.ReplicationCoordinator(work_units, AUTHKEY, max_attempts=2)
+    thread, outcome = serve_in_thread(coordinator)
+
+    run_workers(coordinator.address, 2)
+    thread.join(timeout=60)
+
+    assert isinstance(outcome["error"], RuntimeError)
+    assert "Work unit 1" in str(outcome["error"])
+    assert "unexpected keyword argument 'unknown'" in str(outcome["error"])
+    assert coordinator.attempts[1] == 2
+
+def test_coordinator_requires_authkey_and_listens_on_localhost():
+    with pytest.raises(ValueError):
+        hospital_sim.ReplicationCoordinator([], None)
+    with pytest.raises(ValueError):
+        hospital_sim.run_replication_worker(("127.0.0.1", 1), None)
+
+    coordinator = hospital_sim.ReplicationCoordinator([], AUTHKEY)
+    assert coordinator.address[0] == "127.0.0.1"
+    coordinator.listener.close()
+
+def test_lease_of_a_hung_worker_expires():
+    work_units = [{"simulation_time": SIMULATION_TIME, "seed": 0}]
+    coordinator = hospital_sim.ReplicationCoordinator(work_units, AUTHKEY, lease_timeout=0.5, max_attempts=1)
+    thread, outcome = serve_in_thread(coordinator)
+
+    # Leases the unit and keeps the connection open without ever answering
+    with Client(coordinator.address, authkey=AUTHKEY) as hung_worker:
+        hung_worker.send(("request",))
+        assert hung_worker.recv()[0] == "work"
+        thread.join(timeout=30)
+
+    assert not thread.is_alive()
+    assert isinstance(outcome["error"], RuntimeError)
+    assert "Lease expired" in str(outcome["error"])
+
+def test_command_line_worker_reads_the_authkey_from_the_environment_or_a_file(tmp_path):
+    work_units = [{"simulation_time": SIMULATION_TIME, "seed": seed} for seed in range(2)]
+    coordinator = hospital_sim.ReplicationCoordinator(work_units, AUTHKEY)
+    thread, outcome = serve_in_thread(coordinator)
+    host, port = coordinator.address
+
+    environment = dict(os.environ, **{hospital_sim.AUTHKEY_ENVIRONMENT_VARIABLE: AUTHKEY.decode()})
+    worker = subprocess.run([sys.executable, SCRIPT, "--worker", f"{host}:{port}"], env=environment,
+                            capture_output=True, text=True, timeout=120)
+    thread.join(timeout=60)
+
+    assert worker.returncode == 0, worker.stderr
+    assert "Completed 2 work units" in worker.stdout
+    assert outcome["results"] == [hospital_sim.emergency_department_simulation(**unit) for unit in work_units]
+
+    authkey_file = tmp_path / "authkey"
+    authkey_file.write_bytes(AUTHKEY + b"\n")
+    assert hospital_sim.read_authkey(authkey_file) == AUTHKEY
+    environment.pop(hospital_sim.AUTHKEY_ENVIRONMENT_VARIABLE)
+    missing_authkey = subprocess.run([sys.executable, SCRIPT, "--worker", f"{host}:{port}"], env=environment,
+                                     capture_output=True, text=True, timeout=60)
+    assert missing_authkey.returncode == 2
+    assert "authkey" in missing_authkey.stderr
+
+def test_command_line_addresses_are_parsed():
+    assert hospital_sim.parse_address("127.0.0.1:50000") == ("127.0.0.1", 50000)
+    for address in ["127.0.0.1", ":50000", "localhost:port"]:
+        with pytest.raises(ValueError):
+            hospital_sim.parse_address(address)
@@ -0,0 +1,40 @@
+import math
+
+import hospital_sim
+
+SIMULATION_TIME = 12 * 60
+THRESHOLD = 6
+
+def crude_monte_carlo(runs):
+    hits = 0
+    for seed in range(runs):
+        hospital_sim.emergency_department_simulation(
+            SIMULATION_TIME, seed=seed, warm_up_time=math.inf,
+            stop_condition=lambda: hospital_sim.bed_queue_length() >= THRESHOLD or hospital_sim.fel[0].time > SIMULATION_TIME)
+        hits += hospital_sim.bed_queue_length() >= THRESHOLD
+    return hits / runs
+
+def test_splitting_agrees_with_crude_monte_carlo():
+    # The bed queue reaches 6 within half a day about once in eight runs, cheap enough to check directly
+    runs = 400
+    crude = crude_monte_carlo(runs)
+    crude_standard_error = math.sqrt(crude * (1 - crude) / runs)
+
+    result = hospital_sim.multilevel_splitting([3, THRESHOLD], SIMULATION_TIME, effort=40, repetitions=8, seed=0)
+    low, high = result["Confidence Interval"]
+    splitting_standard_error = (high - low) / 2 / 1.96
+
+    assert 0.05 < crude < 0.25
+    assert abs(result["Probability Estimate"] - crude) < 4 * math.hypot(crude_standard_error, splitting_standard_error)
+
+def test_splitting_snapshots_carry_no_statistics(monkeypatch):
+    snapshots = []
+    capture = hospital_sim.capture_simulation_state
+    monkeypatch.setattr(hospital_sim, "capture_simulation_state", lambda: snapshots.append(capture()) or snapshots[-1])
+    hospital_sim.multilevel_splitting([3, THRESHOLD], SIMULATION_TIME, effort=10, repetitions=1, seed=0)
+
+    assert snapshots
+    for state in snapshots:
+        assert state["time_in_diversion"] == []
+        assert all(values == [] for values in state["time_weighted_queue"].values())
+        assert all(values == [] for values in state["server_uptime"].values())